@@ -11,19 +11,23 @@ def doGet(request, session):
 		REDIRECT_URI?code=XXXX&state=YYYY
 	"""
 	
-	from google.auth import GoogleOAuthClient
+	from google.auth import GoogleOAuthClient, verify_oauth_state
 	
 	logger = system.util.getLogger("GoogleOAuthRedirect")
 	
+	def _first(v):
+		# Google sometimes returns multi-value fields as lists.
+		return v[0] if isinstance(v, (list, tuple)) else v
+	
 	# Extract query parameters delivered to the WebDev resource.
 	# `params` contains OAuth2 values such as code, state, and error.
 	params = request.get("params", {})
 	logger.info("OAuth redirect params: %s" % params)
 	
-	# Extract OAuth parameters from the query string.
-	code  = params.get("code")
-	error = params.get("error")
-	state = params.get("state")
+	# Extract OAuth parameters from the query string (normalized once).
+	code  = _first(params.get("code"))
+	error = _first(params.get("error"))
+	state = _first(params.get("state"))
 	
 	# The actual servlet response object provided by Ignition WebDev.
 	# It can be None when running in certain contexts.
@@ -43,17 +47,7 @@ def doGet(request, session):
 		return {"html": "<h2>Error: No root_tag in session</h2>"}
 	
 	# ------------------------------------------------------------
-	# 1) Normalize parameters
-	# Google sometimes returns multi-value fields as lists.
-	# Convert them to single values for consistency.
-	# ------------------------------------------------------------
-	if isinstance(code, (list, tuple)):
-		code = code[0]
-	if isinstance(state, (list, tuple)):
-		state = state[0]
-	
-	# ------------------------------------------------------------
-	# 2) Google returned an OAuth error
+	# 1) Google returned an OAuth error
 	# Example: access_denied, disallowed_useragent, etc.
 	# ------------------------------------------------------------
 	if error:
@@ -68,7 +62,7 @@ def doGet(request, session):
 		return {"html": html}
 	
 	# ------------------------------------------------------------
-	# 3) Missing authorization code
+	# 2) Missing authorization code
 	# This indicates the user was not redirected correctly or the 
 	# Google auth flow was blocked/cancelled.
 	# ------------------------------------------------------------
@@ -84,17 +78,21 @@ def doGet(request, session):
 		return {"html": html}
 	
 	# ------------------------------------------------------------
-	# 4) Validate OAuth state parameter (SECURITY CHECK)
+	# 3) Validate OAuth state parameter (SECURITY CHECK)
 	#
-	# State protects against CSRF. The value must match the one
-	# generated by /google/oauth/start and stored in session.
+	# State protects against CSRF. The value must carry a valid HMAC
+	# issued by /google/oauth/start for this same HTTP session and
+	# root_tag, and must not be older than a few minutes.
 	#
-	# If it does not match, this request might be forged.
+	# If it does not verify, this request might be forged.
+	# A state is accepted only once: a replayed state is rejected here
+	# (the used nonces are remembered per gateway; on another gateway
+	# the single-use Google authorization code still makes it fail).
 	# ------------------------------------------------------------
-	expected_state = session.get("google_oauth_state", None)
+	session_id = request["servletRequest"].getSession().getId()
 	
-	if not state or not expected_state or state != expected_state:
-		logger.warn("Invalid or missing OAuth state. state=%s, expected=%s" % (state, expected_state))
+	if not verify_oauth_state(root_tag, state, session_id):
+		logger.warn("Invalid or missing OAuth state. state=%s" % state)
 		if servletResponse is not None:
 			servletResponse.setStatus(400)
 		html = (
@@ -105,29 +103,12 @@ def doGet(request, session):
 		)
 		return {"html": html}
 	
-	# ------------------------------------------------------------
-	# 5) Consume the state value (One-Time Token)
-	#
-	# OAuth state must never be reused. Removing it from the session
-	# ensures replay attacks cannot succeed.
-	# ------------------------------------------------------------
-	try:
-		del session["google_oauth_state"]
-	except KeyError:
-		pass
-	
-	# ------------------------------------------------------------
-	# 6) Normalize code again (Google sometimes returns arrays)
-	# ------------------------------------------------------------
-	if isinstance(code, (list, tuple)):
-		code = code[0]
-	
 	# Initialize the OAuth client using the resolved root_tag.
 	client = GoogleOAuthClient(root_tag)
 	
 	try:
 		# --------------------------------------------------------
-		# 7) Exchange authorization code for tokens
+		# 4) Exchange authorization code for tokens
 		#
 		# Google returns:
 		#   - access_token  (short-lived)
@@ -156,7 +137,7 @@ def doGet(request, session):
 		return {"html": html}
 	
 	# ------------------------------------------------------------
-	# 8) Handle any internal server-side exception
+	# 5) Handle any internal server-side exception
 	# ------------------------------------------------------------
 	except Exception, e:
 		logger.error("Error in Google OAuth redirect handler: %s" % e)
@@ -5,13 +5,13 @@ def doGet(request, session):
 	
 	Purpose:
 		This endpoint initiates the Google OAuth 2.0 flow from Ignition.
-		It generates a CSRF protection 'state', stores it in the Ignition session,
+		It generates a CSRF protection 'state' bound to the caller's HTTP session,
 		builds the Google authorization URL, and redirects the user's browser to Google.
 	
 	Why this endpoint exists:
 		- Google OAuth requires a 'state' value to prevent CSRF attacks.
-		- Ignition WebDev cannot rely on cookies the same way normal web apps do,
-			so we manually store the 'state' inside the WebDev session object.
+		- The 'state' is signed (HMAC) together with the servlet session id,
+			so nothing has to be stored in the WebDev session to verify it later.
 		- After this function executes, the user's browser must be redirected
 			to the Google Login/Consent Screen.
 	"""
@@ -19,8 +19,7 @@ def doGet(request, session):
 	# ----------------------------------------------------------
 	# Imports
 	# ----------------------------------------------------------
-	from google.auth import GoogleOAuthClient
-	import uuid
+	from google.auth import GoogleOAuthClient, build_oauth_state
 	
 	# Path to your Google Authentication UDT root.
 	# Must match the actual Tag structure in Ignition.
@@ -40,10 +39,12 @@ def doGet(request, session):
 	#   - At the redirect endpoint, we compare both values.
 	#   - If mismatched → someone attempted CSRF or the flow is invalid.
 	#
-	# We store the state in Ignition's session object,
-	# which persists across WebDev requests for the same user session.
-	state = uuid.uuid4().hex
-	session["google_oauth_state"] = state
+	# The state is "<issued_ms>.<nonce>.<HMAC(root, session id, issued_ms.nonce)>",
+	# signed with the key kept in the UDT's StateSecret tag, so the redirect
+	# endpoint can verify it without any session storage, after a project
+	# save, and on any gateway that shares the tag.
+	session_id = request["servletRequest"].getSession().getId()
+	state = build_oauth_state(ROOT_OAUTH_TAG, session_id)
 	logger.info("Generated OAuth state: %s" % state)
 
 	# ----------------------------------------------------------
@@ -81,7 +82,10 @@ def doGet(request, session):
 	#         * Browser still navigates to Google
 	#
 	# The HTML also contains a backup <a> link for manual navigation.
-	html = u"""
+	# WebDev resources are a single function, so the template cannot live at
+	# module level; the three literal pieces are plain code-object constants
+	# and the URL is concatenated in, without a %-format pass per request.
+	html_pre = u"""
 	<html>
 	  <head>
 	    <meta charset="utf-8" />
@@ -93,7 +97,8 @@ def doGet(request, session):
 	      prevents double-response commit issues in Ignition WebDev.
 	    -->
 	    <script type="text/javascript">
-	      window.location.href = "%s";
+	      window.location.href = \""""
+	html_mid = u"""\";
 	    </script>
 	  </head>
 
@@ -104,11 +109,13 @@ def doGet(request, session):
 	    </p>
 	
 	    <p>
-	      <a href="%s">Continue to Google OAuth</a>
+	      <a href=\""""
+	html_post = u"""\">Continue to Google OAuth</a>
 	    </p>
 	  </body>
 	</html>
-	""" % (auth_url, auth_url)
+	"""
+	html = html_pre + auth_url + html_mid + auth_url + html_post
 
 	# WebDev returns exactly one response (HTML)
 	return {"html": html}
\ No newline at end of file
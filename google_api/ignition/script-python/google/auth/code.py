@@ -13,19 +13,169 @@
 # -----------------------------------------------------------
 
 import json
-import urllib
+import jarray
 
-from java.lang import String
-from java.security import KeyFactory, Signature
+from java.lang import IllegalArgumentException, String, System, Throwable
+from java.net import URLEncoder
+from java.nio.charset import StandardCharsets
+from java.security import KeyFactory, MessageDigest, SecureRandom, Signature
 from java.security.spec import PKCS8EncodedKeySpec
 from java.util import Base64 as JBase64
+from java.util import UUID
+from javax.crypto import Mac
+from javax.crypto.spec import SecretKeySpec
+from java.util.regex import Pattern
+from java.util.concurrent.locks import ReentrantLock
 
 GOOGLE_TOKEN_ENDPOINT = "https://oauth2.googleapis.com/token"
 
+# ===========================================================
+# UDT Parameter cache
+# ===========================================================
+
+# {root_tag_path: (expiry_epoch_ms, cfg_dict)}
+_CFG_CACHE = {}
+
+def _get_cfg(root_tag_path, ttl_ms=60000):
+	"""
+	Return the UDT parameters of root_tag_path as a dictionary.
+	
+	system.tag.getConfiguration is an expensive gateway call and the clients
+	are instantiated per request, so the parsed parameters are kept for ttl_ms.
+	
+	Args:
+		root_tag_path (str): Path to the UDT instance.
+		ttl_ms        (int): How long a cached entry stays valid (ms).
+	
+	Returns:
+		dict: auth_uri, redirect_uri, token_uri, scope
+	"""
+	now_ms = System.currentTimeMillis()
+	cached = _CFG_CACHE.get(root_tag_path)
+	if cached is not None and now_ms < cached[0]:
+		return cached[1]
+
+	params = system.tag.getConfiguration(root_tag_path)[0].get("parameters", None)		# Modify with your enviroment
+	if not params:
+		raise ValueError("Please check the 'root_tag_path' configuration")
+
+	cfg = {
+		"auth_uri": params["Auth URI"].value,										# Modify with your enviroment
+		"redirect_uri": params["Redirect URI"].value,								# Modify with your enviroment
+		"token_uri": params["Token URI"].value or GOOGLE_TOKEN_ENDPOINT,			# Modify with your enviroment
+		"scope": params["Scope"].value,												# Modify with your enviroment
+	}
+	_CFG_CACHE[root_tag_path] = (now_ms + ttl_ms, cfg)
+	return cfg
+
+# {root_tag_path: (expiry_epoch_ms, use_sa)}
+_USE_SA_CACHE = {}
+
+def _get_use_sa(root_tag_path, ttl_ms=5000):
+	"""
+	Return the UseSA flag of root_tag_path.
+	
+	Only used by GoogleAuthProvider to pick which token cache entry to check
+	without reading the credential DataSets. It is kept for ttl_ms, so a
+	change of UseSA takes effect within a few seconds.
+	
+	Args:
+		root_tag_path (str): Path to the UDT instance.
+		ttl_ms        (int): How long a cached entry stays valid (ms).
+	
+	Returns:
+		bool: True → Service Account, False → OAuth Client
+	"""
+	now_ms = System.currentTimeMillis()
+	cached = _USE_SA_CACHE.get(root_tag_path)
+	if cached is not None and now_ms < cached[0]:
+		return cached[1]
+
+	use_sa = bool(system.tag.readBlocking([u"%s/UseSA" % root_tag_path])[0].value)		# Modify with your enviroment
+	_cache_use_sa(root_tag_path, use_sa, ttl_ms)
+	return use_sa
+
+def _cache_use_sa(root_tag_path, use_sa, ttl_ms=5000):
+	_USE_SA_CACHE[root_tag_path] = (System.currentTimeMillis() + ttl_ms, use_sa)
+
+# ===========================================================
+# Shared HTTP client
+# ===========================================================
+
+_HTTP_CLIENT = None
+
+def _get_http():
+	"""
+	Return the module-wide system.net.httpClient, creating it on first use.
+	
+	One client keeps its connection pool, so token calls reuse the TLS
+	connection to the token endpoint instead of handshaking every time.
+	"""
+	global _HTTP_CLIENT
+	if _HTTP_CLIENT is None:
+		_HTTP_CLIENT = system.net.httpClient(timeout=10000)		# ms
+	return _HTTP_CLIENT
+
+def _enc_body(pairs):
+	"""
+	Build an x-www-form-urlencoded body from (key, value) pairs.
+	
+	Keys must be URL-safe literals; only the values are percent-encoded.
+	
+	Args:
+		pairs (list[tuple]): [(key, value), ...] in the order to send.
+	
+	Returns:
+		str: "k1=v1&k2=v2..."
+	"""
+	return u"&".join([u"%s=%s" % (k, URLEncoder.encode(v or u"", "UTF-8")) for k, v in pairs])
+
+# The assertion is base64url + "." only, so it can be appended without encoding.
+_JWT_BEARER_BODY_PREFIX = u"grant_type=%s&assertion=" % URLEncoder.encode(
+	"urn:ietf:params:oauth:grant-type:jwt-bearer", "UTF-8")
+
+# ===========================================================
+# Access token cache
+# ===========================================================
+
+# {tag_path: (access_token, expiry_epoch_ms)}
+_TOK_CACHE = {}
+
+def _get_cached_token(tag_path):
+	"""
+	Return the in-process access_token of tag_path, or None if missing/expired.
+	
+	The expiry is kept as epoch milliseconds so the check is a plain long
+	compare; it already carries the 60s safety margin applied on refresh.
+	"""
+	cached = _TOK_CACHE.get(tag_path)
+	if cached is not None and cached[0] and System.currentTimeMillis() < cached[1]:
+		return cached[0]
+	return None
+
+def _cache_token(tag_path, access_token, expiry):
+	"""
+	Args:
+		expiry (java.util.Date): token_expiry as written to the DataSet.
+	"""
+	_TOK_CACHE[tag_path] = (access_token, expiry.getTime())
+
+# {tag_path: ReentrantLock}, so only one token refresh per DataSet is in flight
+_REFRESH_LOCKS = {}
+
+def _get_refresh_lock(tag_path):
+	lock = _REFRESH_LOCKS.get(tag_path)
+	if lock is None:
+		lock = _REFRESH_LOCKS.setdefault(tag_path, ReentrantLock())
+	return lock
+
 # ===========================================================
 # OAuth 2.0 (User-based)
 # ===========================================================
 
+# {(auth_uri, client_id, scope, redirect_uri): "auth_uri?access_type=...&prompt=consent"}
+_AUTH_URL_PREFIX_CACHE = {}
+
 class GoogleOAuthClient(object):
 	"""
 	OAuth 2.0 client (user account based).
@@ -33,6 +183,8 @@ class GoogleOAuthClient(object):
 	  columns: client_id, client_secret, refresh_token, access_token, token_expiry
 	"""
 
+	COLUMNS = ("client_id", "client_secret", "refresh_token", "access_token", "token_expiry")
+
 	def __init__(self, root_tag_path):
 		"""
 		Args:
@@ -41,21 +193,18 @@ class GoogleOAuthClient(object):
 		self.root_tag_path = root_tag_path												# Modify with your enviroment
 		self.tag_path = "%s/OAuthClient" % root_tag_path									# Modify with your enviroment
 		
-		cfg = system.tag.getConfiguration(root_tag_path)[0].get("parameters", None)			# Modify with your enviroment
-		if cfg:
-			self.auth_uri = cfg["Auth URI"].value											# Modify with your enviroment
-			self.redirect_uri = cfg["Redirect URI"].value									# Modify with your enviroment
-			self.token_uri = cfg["Token URI"].value or GOOGLE_TOKEN_ENDPOINT			# Modify with your enviroment
-			self.default_scope = cfg["Scope"].value										# Modify with your enviroment
-			self.logger = system.util.getLogger("GoogleOAuthClient")
-		else:
-			raise ValueError("Please check the 'root_tag_path' configuration")
+		cfg = _get_cfg(root_tag_path)
+		self.auth_uri = cfg["auth_uri"]
+		self.redirect_uri = cfg["redirect_uri"]
+		self.token_uri = cfg["token_uri"]
+		self.default_scope = cfg["scope"]
+		self.logger = system.util.getLogger("GoogleOAuthClient")
 
 	# ------------------------------------------------------
 	# DataSet helpers
 	# ------------------------------------------------------
 
-	def _read_dataset(self):
+	def _read_dataset(self, qv=None):
 		"""
 		Read the DataSet tag and return its first row as a dictionary.
 		
@@ -63,28 +212,25 @@ class GoogleOAuthClient(object):
 			client_id, client_secret, refresh_token, access_token, token_expiry
 			
 		If the DataSet has no rows, it is initialized with a default row.
+		
+		Args:
+			qv (QualifiedValue or None): Already read value of the DataSet tag.
+				If None, the tag is read here.
 		"""
-		result = system.tag.readBlocking([self.tag_path])[0]
-		ds = result.value
+		if qv is None:
+			qv = system.tag.readBlocking([self.tag_path])[0]
+		ds = qv.value
 		
 		if ds is None or ds.rowCount == 0:
 			default_row = [["", "", "", "", system.date.now()]]	# Manually modifiable values
-			default_ds = system.dataset.toDataSet(
-				["client_id", "client_secret", "refresh_token", "access_token", "token_expiry"],
-				default_row,
-			)
+			default_ds = system.dataset.toDataSet(list(self.COLUMNS), default_row)
 			system.tag.writeBlocking([self.tag_path], [default_ds])
 			ds = default_ds
 
-		row = ds[0]
-		return {
-			"client_id": row["client_id"],
-			"client_secret": row["client_secret"],
-			"refresh_token": row["refresh_token"],
-			"access_token": row["access_token"],
-			"token_expiry": row["token_expiry"],
-			"_dataset": ds,
-		}
+		# Read row 0 cell by cell in Java, no PyRow wrapper per access.
+		info = dict([(col, ds.getValueAt(0, col)) for col in self.COLUMNS])
+		info["_dataset"] = ds
+		return info
 
 	def _write_dataset(self, values):
 		"""
@@ -95,24 +241,24 @@ class GoogleOAuthClient(object):
 		Args:
 			values (dict): May contain client_id, client_secret, refresh_token,
 			access_token, token_expiry, _dataset.
+		
+		Returns:
+			QualityCode: Result of the tag write; callers decide how to report a bad one.
 		"""
 		ds = values.get("_dataset")
 		if ds is None:
 			ds = system.tag.readBlocking([self.tag_path])[0].value
 
+		# Row 0 is patched in one Java call; no other cell is read into Jython
+		# and the DataSet is copied once instead of once per changed column.
 		col_names = list(ds.getColumnNames())
-		updated_rows = []
+		changes = dict([(col, values[col]) for col in col_names if col in values])
+		if changes:
+			ds = system.dataset.updateRow(ds, 0, changes)
 
-		for row_index in range(ds.rowCount):
-			row = list(ds[row_index])
-			if row_index == 0:
-				for idx, col in enumerate(col_names):
-					if col in values:
-						row[idx] = values[col]
-			updated_rows.append(row)
-
-		new_ds = system.dataset.toDataSet(col_names, updated_rows)
-		system.tag.writeBlocking([self.tag_path], [new_ds])
+		# writeBlocking reports failures (bad quality, missing or read-only tag)
+		# as a QualityCode instead of raising.
+		return system.tag.writeBlocking([self.tag_path], [ds])[0]
 
 	# ------------------------------------------------------
 	# Public API
@@ -140,29 +286,33 @@ class GoogleOAuthClient(object):
 #			scope = "https://www.googleapis.com/auth/drive.file"		# Only Drive files created/selected by the app
 			scope = self.default_scope										# Almost all Google Cloud APIs
 
-		params_dict = {
-			"access_type": "offline",   # request refresh_token
-			"response_type": "code",
-			"client_id": client_id,
-			"scope": scope,
-			"redirect_uri": self.redirect_uri,
-			"prompt": "consent",        # force consent screen
-		}
+		# Everything but 'state' is static per client/scope, so the encoded
+		# prefix is built once and only the state is appended per request.
+		key = (self.auth_uri, client_id, scope, self.redirect_uri)
+		prefix = _AUTH_URL_PREFIX_CACHE.get(key)
+		if prefix is None:
+			params = _enc_body([
+				("access_type", "offline"),   # request refresh_token
+				("response_type", "code"),
+				("client_id", client_id),
+				("scope", scope),
+				("redirect_uri", self.redirect_uri),
+				("prompt", "consent"),        # force consent screen
+			])
+			prefix = u"%s?%s" % (self.auth_uri, params)
+			_AUTH_URL_PREFIX_CACHE[key] = prefix
+
 		if state:
-			params_dict["state"] = state
-		params = urllib.urlencode(params_dict)
-#		encoded = []
-#		for k, v in params_dict.items():
-#			encoded.append(u"%s=%s" % (k, v))
-#
-#		params = u"&".join(encoded)
-		return u"%s?%s" % (self.auth_uri, params)
+			return prefix + u"&state=" + URLEncoder.encode(state, "UTF-8")
+		return prefix
 
 	def exchange_code_for_tokens(self, code):
 		"""
 		Exchange authorization code for access_token and refresh_token.
 		
-		Typically called from a WebDev callback.
+		Typically called from a WebDev callback. The tokens are written to the
+		DataSet asynchronously; the access_token is usable immediately through
+		the in-process token cache.
 		
 		Args:
 		    code (str): Authorization code from Google.
@@ -177,20 +327,16 @@ class GoogleOAuthClient(object):
 		if not client_id or not client_secret:
 			raise ValueError("client_id or client_secret is missing in OAuthClient DataSet")
 
-		payload = {
-			"code": code,
-			"client_id": client_id,
-			"client_secret": client_secret,
-			"redirect_uri": self.redirect_uri,
-			"grant_type": "authorization_code",
-		}
+		# (key, value) pairs → x-www-form-urlencoded string
+		body = _enc_body([
+			("code", code),
+			("client_id", client_id),
+			("client_secret", client_secret),
+			("redirect_uri", self.redirect_uri),
+			("grant_type", "authorization_code"),
+		])
 		
-		# dict → x-www-form-urlencoded string
-		body = urllib.urlencode(payload)
-		
-		client = system.net.httpClient(
-			timeout=10000          # ms
-		)
+		client = _get_http()
 		
 		resp = client.post(
 			url=self.token_uri,
@@ -199,7 +345,8 @@ class GoogleOAuthClient(object):
 		)
 
 		status = resp.statusCode
-		jsonResult = resp.json
+		# One conversion to a plain dict; the lookups below stay in Jython.
+		jsonResult = dict(resp.json or {})
 
 		if status != 200:
 			self.logger.error(u"OAuthClient token request failed: %s %s" % (status, jsonResult))
@@ -220,90 +367,160 @@ class GoogleOAuthClient(object):
 		if refresh_token:
 			update["refresh_token"] = refresh_token
 
-		self._write_dataset(update)
+		# The token is cached right away, so the DataSet write does not have to
+		# hold up the redirect page; it is persisted on a gateway thread.
+		_cache_token(self.tag_path, access_token, expiry)
+
+		def persist():
+			# Runs detached from the redirect page, so every failure has to be
+			# logged here or the new refresh_token is lost silently.
+			try:
+				qc = self._write_dataset(update)
+				if not qc.isGood():
+					self.logger.error(u"Failed to store OAuth tokens in %s: %s" % (self.tag_path, qc))
+			except (Exception, Throwable), e:
+				self.logger.error(u"Failed to store OAuth tokens in %s: %s" % (self.tag_path, e))
+
+		system.util.invokeAsynchronous(persist)
 		return access_token, refresh_token
 
-	def refresh_access_token(self):
+	def refresh_access_token(self, info=None):
 		"""
 		Refresh the access_token using the stored refresh_token.
 		
+		Args:
+			info (dict or None): Result of _read_dataset() if already read.
+		
 		Returns:
 			str: Newly issued access_token.
 		"""
-		info = self._read_dataset()
-		client_id = info["client_id"]
-		client_secret = info["client_secret"]
-		refresh_token = info["refresh_token"]
-
-		if not refresh_token:
-			raise ValueError("refresh_token is empty. Initial consent is required.")
-
-		payload = {
-			"client_id": client_id,
-			"client_secret": client_secret,
-			"refresh_token": refresh_token,
-			"grant_type": "refresh_token",
-		}
-
-		body = urllib.urlencode(payload)
-		client = system.net.httpClient(timeout=10000)
-
-		resp = client.post(
-			url=self.token_uri,
-			data=body,
-			headers={"Content-Type": "application/x-www-form-urlencoded"},
-		)
-
-		status = resp.statusCode
-		jsonResult = resp.json
-
-		if status != 200:
-			raise Exception("Token refresh failed: %s %s" % (status, jsonResult))
-		else:
-			self.logger.info(u'%s' % (jsonResult))
-
-		access_token = jsonResult.get("access_token", "")
-		expires_in = int(jsonResult.get("expires_in", 0))
-
-		now = system.date.now()
-		expiry = system.date.addSeconds(now, expires_in - 60)
-
-		update = {
-			"_dataset": info["_dataset"],
-			"access_token": access_token,
-			"token_expiry": expiry,
-		}
-		self._write_dataset(update)
-		return access_token
+		lock = _get_refresh_lock(self.tag_path)
+		lock.lock()
+		try:
+			if info is None:
+				info = self._read_dataset()
+			client_id = info["client_id"]
+			client_secret = info["client_secret"]
+			refresh_token = info["refresh_token"]
+
+			if not refresh_token:
+				raise ValueError("refresh_token is empty. Initial consent is required.")
+
+			# refresh_token contains "/" (e.g. "1//0g..."), so it must stay encoded.
+			body = _enc_body([
+				("client_id", client_id),
+				("client_secret", client_secret),
+				("refresh_token", refresh_token),
+				("grant_type", "refresh_token"),
+			])
+			client = _get_http()
+
+			resp = client.post(
+				url=self.token_uri,
+				data=body,
+				headers={"Content-Type": "application/x-www-form-urlencoded"},
+			)
 
-	def get_valid_access_token(self):
+			status = resp.statusCode
+			jsonResult = dict(resp.json or {})
+
+			if status != 200:
+				raise Exception("Token refresh failed: %s %s" % (status, jsonResult))
+			else:
+				self.logger.info(u'%s' % (jsonResult))
+
+			access_token = jsonResult.get("access_token", "")
+			expires_in = int(jsonResult.get("expires_in", 0))
+
+			now = system.date.now()
+			expiry = system.date.addSeconds(now, expires_in - 60)
+
+			update = {
+				"_dataset": info["_dataset"],
+				"access_token": access_token,
+				"token_expiry": expiry,
+			}
+			# Only access_token / token_expiry are written here and the token is
+			# served from the in-process cache, so a failed write is logged but
+			# does not fail the call; it is re-requested after a restart.
+			qc = self._write_dataset(update)
+			if not qc.isGood():
+				self.logger.warn(u"Failed to store access_token in %s: %s" % (self.tag_path, qc))
+			_cache_token(self.tag_path, access_token, expiry)
+			return access_token
+		finally:
+			lock.unlock()
+
+	def get_valid_access_token(self, qv=None):
 		"""
 		Return a valid access token, refreshing it when necessary.
 		
+		The in-process token cache is checked first; the DataSet tag is only
+		read when it has no valid entry.
+		
+		Args:
+			qv (QualifiedValue or None): Already read value of the OAuthClient DataSet tag.
+		
 		Returns:
 			str: Valid access_token string.
 		"""
-		info = self._read_dataset()
-		token = info["access_token"]
-		expiry = info["token_expiry"]
-		now = system.date.now()
+		token = _get_cached_token(self.tag_path)
+		if token:
+			return token
+
+		lock = _get_refresh_lock(self.tag_path)
+		lock.lock()
+		try:
+			# Another caller may have refreshed the token while this one waited.
+			token = _get_cached_token(self.tag_path)
+			if token:
+				return token
 
-		if (not token) or (expiry is None) or expiry.before(now):
-			return self.refresh_access_token()
+			info = self._read_dataset(qv)
+			token = info["access_token"]
+			expiry = info["token_expiry"]
+			now = system.date.now()
 
-		return token
+			if (not token) or (expiry is None) or expiry.before(now):
+				return self.refresh_access_token(info)
+
+			_cache_token(self.tag_path, token, expiry)
+			return token
+		finally:
+			lock.unlock()
 
 
 # ===========================================================
 # Service Account (Server-based)
 # ===========================================================
 
+# KeyFactory.getInstance walks the JCA provider list, so it is looked up once.
+_RSA_KF = KeyFactory.getInstance("RSA")
+
+# Base64.Encoder is immutable and thread-safe.
+_B64URL_ENCODER = JBase64.getUrlEncoder().withoutPadding()
+
+# The JWT header never changes; encode it once, together with the "."
+# that separates it from the claims in the signing input.
+_JWT_HEADER_B64 = _B64URL_ENCODER.encodeToString(
+	String('{"alg":"RS256","typ":"JWT"}').getBytes(StandardCharsets.UTF_8))
+_JWT_SIGNING_PREFIX = String(_JWT_HEADER_B64 + ".").getBytes(StandardCharsets.US_ASCII)
+
+_PEM_BODY_RE = Pattern.compile("-----BEGIN[^-]*-----(.*?)-----END", Pattern.DOTALL)
+_PEM_NOISE_RE = Pattern.compile("\\\\[rn]|\\s+")
+
+# {private_key_pem: java.security.PrivateKey}
+_PRIV_KEY_CACHE = {}
+
 class GoogleServiceAccountClient(object):
 	"""
 	Service Account (server based).
 	- DataSet: [root]/ServiceAccount
 	  columns: client_email, private_key, access_token, token_expiry
 	"""
+
+	COLUMNS = ("client_email", "private_key", "access_token", "token_expiry")
+
 	def __init__(self, root_tag_path):
 		"""
 		Args:
@@ -311,35 +528,35 @@ class GoogleServiceAccountClient(object):
 		"""
 		self.root_tag_path = root_tag_path												# Modify with your enviroment
 		self.tag_path = "%s/ServiceAccount" % root_tag_path								# Modify with your enviroment
-		cfg = system.tag.getConfiguration(root_tag_path)[0]["parameters"]				# Modify with your enviroment
-		self.scope = cfg["Scope"].value													# Modify with your enviroment
-		self.token_uri = cfg["Token URI"].value or GOOGLE_TOKEN_ENDPOINT				# Modify with your enviroment
+		cfg = _get_cfg(root_tag_path)
+		self.scope = cfg["scope"]
+		self.token_uri = cfg["token_uri"]
 		self.logger = system.util.getLogger("GoogleServiceAccountClient")				# Modify with your enviroment
 
 	# ------------------------------------------------------
 	# DataSet helpers
 	# ------------------------------------------------------
-	def _read_dataset(self):
-		result = system.tag.readBlocking([self.tag_path])[0]
-		ds = result.value
+	def _read_dataset(self, qv=None):
+		"""
+		Read the DataSet tag and return its first row as a dictionary.
+		
+		Args:
+			qv (QualifiedValue or None): Already read value of the DataSet tag.
+				If None, the tag is read here.
+		"""
+		if qv is None:
+			qv = system.tag.readBlocking([self.tag_path])[0]
+		ds = qv.value
 		
 		if ds is None or ds.rowCount == 0:
 			default_row = [["", "", "", system.date.now()]]
-			default_ds = system.dataset.toDataSet(
-				["client_email", "private_key", "access_token", "token_expiry"],
-				default_row,
-			)
+			default_ds = system.dataset.toDataSet(list(self.COLUMNS), default_row)
 			system.tag.writeBlocking([self.tag_path], [default_ds])
-			return default_ds
-
-		row = ds[0]
-		return {
-			"client_email": row["client_email"],
-			"private_key": row["private_key"],
-			"access_token": row["access_token"],
-			"token_expiry": row["token_expiry"],
-			"_dataset": ds,
-		}
+			ds = default_ds
+
+		info = dict([(col, ds.getValueAt(0, col)) for col in self.COLUMNS])
+		info["_dataset"] = ds
+		return info
 
 	def _write_dataset(self, values):
 		"""
@@ -350,51 +567,54 @@ class GoogleServiceAccountClient(object):
 		Args:
 			values (dict): May contain client_email, private_key,
 			access_token, token_expiry, _dataset.
+		
+		Returns:
+			QualityCode: Result of the tag write; callers decide how to report a bad one.
 		"""
 		ds = values.get("_dataset")
 		if ds is None:
 			ds = system.tag.readBlocking([self.tag_path])[0].value
 		
+		# Row 0 is patched in one Java call; no other cell is read into Jython
+		# and the DataSet is copied once instead of once per changed column.
 		col_names = list(ds.getColumnNames())
-		updated_rows = []
-		
-		for row_index in range(ds.rowCount):
-			row = list(ds[row_index])
-			if row_index == 0:
-				for idx, col in enumerate(col_names):
-					if col in values:
-						row[idx] = values[col]
-			updated_rows.append(row)
+		changes = dict([(col, values[col]) for col in col_names if col in values])
+		if changes:
+			ds = system.dataset.updateRow(ds, 0, changes)
 
-		new_ds = system.dataset.toDataSet(col_names, updated_rows)
-		system.tag.writeBlocking([self.tag_path], [new_ds])
+		# writeBlocking reports failures (bad quality, missing or read-only tag)
+		# as a QualityCode instead of raising.
+		return system.tag.writeBlocking([self.tag_path], [ds])[0]
 
 	# ------------------------------------------------------
 	# JWT helpers
 	# ------------------------------------------------------
 
 	def _base64url_encode(self, b):
-		encoder = JBase64.getUrlEncoder().withoutPadding()
-		return encoder.encodeToString(b)
+		return _B64URL_ENCODER.encodeToString(b)
 
 	def _load_private_key(self, private_key_pem):
 		if not private_key_pem:
 			raise ValueError("private_key is empty in ServiceAccount DataSet")
-		lines = private_key_pem.replace("\\r", "").split("\\n")
-		b64_lines = []
-		for line in lines:
-			line = line.strip()
-			if (not line) or line.startswith("-----BEGIN") or line.startswith("-----END"):
-				continue
-			b64_lines.append(line)
-		b64_str = "".join(b64_lines)
+
+		# Parsing the RSA key is costly and the key rarely changes.
+		privateKey = _PRIV_KEY_CACHE.get(private_key_pem)
+		if privateKey is not None:
+			return privateKey
+
+		# Take the body between the BEGIN/END markers (or the whole text if
+		# there are none) and drop whitespace and escaped "\\r"/"\\n" sequences
+		# left over from pasting the JSON key file.
+		m = _PEM_BODY_RE.matcher(private_key_pem)
+		body = m.group(1) if m.find() else private_key_pem
+		b64_str = _PEM_NOISE_RE.matcher(body).replaceAll("")
 		
 		decoder = JBase64.getDecoder()
 		key_bytes = decoder.decode(b64_str)
 		
-		kf = KeyFactory.getInstance("RSA")
 		spec = PKCS8EncodedKeySpec(key_bytes)
-		privateKey = kf.generatePrivate(spec)
+		privateKey = _RSA_KF.generatePrivate(spec)
+		_PRIV_KEY_CACHE[private_key_pem] = privateKey
 		return privateKey
 
 	def _build_jwt_assertion(self, client_email, private_key_pem):
@@ -409,10 +629,6 @@ class GoogleServiceAccountClient(object):
 		now_sec = now_ms / 1000
 		exp_sec = now_sec + 3600
 		
-		header = {
-			"alg": "RS256",
-			"typ": "JWT",
-		}
 		claim_set = {
 			"iss": client_email,
 			"scope": self.scope,
@@ -421,87 +637,101 @@ class GoogleServiceAccountClient(object):
 			"exp": int(exp_sec),
 		}
 		
-		header_json = json.dumps(header, separators=(",", ":"))
 		claims_json = json.dumps(claim_set, separators=(",", ":"))
-		
-		header_b64 = self._base64url_encode(String(header_json).getBytes("UTF-8"))
-		claims_b64 = self._base64url_encode(String(claims_json).getBytes("UTF-8"))
-
-		signing_input_str = header_b64 + "." + claims_b64
-		signing_input_bytes = String(signing_input_str).getBytes("UTF-8")
+		claims_b64 = self._base64url_encode(String(claims_json).getBytes(StandardCharsets.UTF_8))
 
+		# Signature is a streaming API: feed "header.claims" piecewise
+		# instead of concatenating the signing input first.
 		sig = Signature.getInstance("SHA256withRSA")
 		sig.initSign(privateKey)
-		sig.update(signing_input_bytes)
+		sig.update(_JWT_SIGNING_PREFIX)
+		sig.update(String(claims_b64).getBytes(StandardCharsets.US_ASCII))
 		signature_bytes = sig.sign()
 		
 		signature_b64 = self._base64url_encode(signature_bytes)
-		jwt_assertion = signing_input_str + "." + signature_b64
+		jwt_assertion = u"%s.%s.%s" % (_JWT_HEADER_B64, claims_b64, signature_b64)
 		return jwt_assertion
 	
 	# ------------------------------------------------------
 	# Token request / refresh
 	# ------------------------------------------------------
 
-	def _request_access_token(self):
-		info = self._read_dataset()
-		client_email = info["client_email"]
-		private_key = info["private_key"]
-		
-		assertion = self._build_jwt_assertion(client_email, private_key)
+	def _request_access_token(self, info=None):
+		lock = _get_refresh_lock(self.tag_path)
+		lock.lock()
+		try:
+			if info is None:
+				info = self._read_dataset()
+			client_email = info["client_email"]
+			private_key = info["private_key"]
 		
-		params_dict = {
-			"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-			"assertion": assertion,
-		}
+			assertion = self._build_jwt_assertion(client_email, private_key)
 		
-		params = urllib.urlencode(params_dict)
+			params = _JWT_BEARER_BODY_PREFIX + assertion
 		
-#		encoded = []
-#		for k, v in params_dict.items():
-#			encoded_pairs.append(u"%s=%s" % (k, v))
-#		params = u"&".join(encoded)
-		
-		client = system.net.httpClient(timeout=10000)
-		resp = client.post(
-			url=self.token_uri,
-			data=params,
-			headers={"Content-Type": "application/x-www-form-urlencoded"},
-		)
-		
-		status = resp.statusCode
-		jsonResult = resp.json
-		
-		if status != 200:
-			self.logger.error(u"ServiceAccount token request failed: %s %s" % (status, jsonResult))
-			raise Exception(u"ServiceAccount token request failed: HTTP %s" % status)
-		else:
-			self.logger.info(u'%s' % (jsonResult))
-		
-		access_token = jsonResult.get("access_token", "")
-		expires_in = int(jsonResult.get("expires_in", 3600))
-		
-		now = system.date.now()
-		expiry = system.date.addSeconds(now, expires_in - 60)
-		
-		update = {
-			"_dataset": info["_dataset"],
-			"access_token": access_token,
-			"token_expiry": expiry,
-		}
-		self._write_dataset(update)
-		return access_token
-
-	def get_valid_access_token(self):
-		info = self._read_dataset()
-		token = info["access_token"]
-		expiry = info["token_expiry"]
-		now = system.date.now()
+			client = _get_http()
+			resp = client.post(
+				url=self.token_uri,
+				data=params,
+				headers={"Content-Type": "application/x-www-form-urlencoded"},
+			)
 		
-		if (not token) or (expiry is None) or expiry.before(now):
-			return self._request_access_token()
+			status = resp.statusCode
+			jsonResult = dict(resp.json or {})
+		
+			if status != 200:
+				self.logger.error(u"ServiceAccount token request failed: %s %s" % (status, jsonResult))
+				raise Exception(u"ServiceAccount token request failed: HTTP %s" % status)
+			else:
+				self.logger.info(u'%s' % (jsonResult))
+		
+			access_token = jsonResult.get("access_token", "")
+			expires_in = int(jsonResult.get("expires_in", 3600))
+		
+			now = system.date.now()
+			expiry = system.date.addSeconds(now, expires_in - 60)
+		
+			update = {
+				"_dataset": info["_dataset"],
+				"access_token": access_token,
+				"token_expiry": expiry,
+			}
+			# Only access_token / token_expiry are written here and the token is
+			# served from the in-process cache, so a failed write is logged but
+			# does not fail the call; it is re-requested after a restart.
+			qc = self._write_dataset(update)
+			if not qc.isGood():
+				self.logger.warn(u"Failed to store access_token in %s: %s" % (self.tag_path, qc))
+			_cache_token(self.tag_path, access_token, expiry)
+			return access_token
+		finally:
+			lock.unlock()
+
+	def get_valid_access_token(self, qv=None):
+		token = _get_cached_token(self.tag_path)
+		if token:
+			return token
+
+		lock = _get_refresh_lock(self.tag_path)
+		lock.lock()
+		try:
+			# Another caller may have refreshed the token while this one waited.
+			token = _get_cached_token(self.tag_path)
+			if token:
+				return token
+
+			info = self._read_dataset(qv)
+			token = info["access_token"]
+			expiry = info["token_expiry"]
+			now = system.date.now()
+			
+			if (not token) or (expiry is None) or expiry.before(now):
+				return self._request_access_token(info)
 
-		return token
+			_cache_token(self.tag_path, token, expiry)
+			return token
+		finally:
+			lock.unlock()
 
 ## debug
 #from google.auth import GoogleServiceAccountClient
@@ -518,6 +748,112 @@ class GoogleServiceAccountClient(object):
 #print "STATUS:", resp.getStatusCode()
 #print "JSON:", resp.getJson()
 
+# ===========================================================
+# OAuth state (CSRF, bound to the HTTP session)
+# ===========================================================
+
+_STATE_TTL_MS = 10 * 60 * 1000
+
+# {nonce: expiry_epoch_ms} of states already accepted on this gateway
+_USED_STATES = {}
+_USED_STATES_LOCK = ReentrantLock()
+
+def _get_state_key(root_tag_path):
+	"""
+	Return the HMAC key for OAuth states of root_tag_path.
+	
+	The key is derived from the persisted [root]/StateSecret memory tag, so
+	states stay valid across script module reloads (every project save) and
+	verify on any gateway that sees the same tag. An empty secret is
+	generated and written on first use.
+	"""
+	secret_path = u"%s/StateSecret" % root_tag_path									# Modify with your enviroment
+	secret = system.tag.readBlocking([secret_path])[0].value
+	if not secret:
+		key_bytes = jarray.zeros(32, "b")
+		SecureRandom().nextBytes(key_bytes)
+		secret = JBase64.getEncoder().encodeToString(key_bytes)
+		qc = system.tag.writeBlocking([secret_path], [secret])[0]
+		if not qc.isGood():
+			raise Exception(u"Failed to write OAuth state secret %s: %s" % (secret_path, qc))
+
+	digest = MessageDigest.getInstance("SHA-256").digest(String(secret).getBytes(StandardCharsets.UTF_8))
+	return SecretKeySpec(digest, "HmacSHA256")
+
+def _state_mac(key, root_tag_path, session_id, payload):
+	mac = Mac.getInstance("HmacSHA256")		# Mac is not thread-safe, one per call
+	mac.init(key)
+	return mac.doFinal(String(u"%s|%s|%s" % (root_tag_path, session_id, payload)).getBytes(StandardCharsets.UTF_8))
+
+def _consume_state_nonce(nonce, now_ms):
+	"""Mark nonce as used; False if it was already used within _STATE_TTL_MS."""
+	_USED_STATES_LOCK.lock()
+	try:
+		for n in [n for n, exp in _USED_STATES.items() if exp < now_ms]:
+			del _USED_STATES[n]
+		if nonce in _USED_STATES:
+			return False
+		_USED_STATES[nonce] = now_ms + _STATE_TTL_MS
+		return True
+	finally:
+		_USED_STATES_LOCK.unlock()
+
+def build_oauth_state(root_tag_path, session_id):
+	"""
+	Build a CSRF 'state' value bound to the caller's HTTP session.
+	
+	Nothing is stored per flow: the state carries its own issue time and
+	nonce, signed together with the UDT root and the session id.
+	
+	Args:
+		root_tag_path (str): Path to the UDT instance (holds StateSecret).
+		session_id    (str): Servlet session id of the browser starting the flow.
+	
+	Returns:
+		str: "<issued_ms>.<nonce>.<base64url(HMAC-SHA256)>"
+	"""
+	key = _get_state_key(root_tag_path)
+	payload = u"%d.%s" % (System.currentTimeMillis(), UUID.randomUUID().toString().replace("-", ""))
+	return u"%s.%s" % (payload, _B64URL_ENCODER.encodeToString(_state_mac(key, root_tag_path, session_id, payload)))
+
+def verify_oauth_state(root_tag_path, state, session_id):
+	"""
+	Check a 'state' returned by Google against the caller's HTTP session.
+	
+	A state is accepted once: its nonce is remembered on this gateway until
+	the state would have expired anyway.
+	
+	Args:
+		root_tag_path (str): Path to the UDT instance the flow was started for.
+		state         (str): Value of the 'state' query parameter.
+		session_id    (str): Servlet session id of the browser finishing the flow.
+	
+	Returns:
+		bool: True if the state was issued to this session within _STATE_TTL_MS
+			  and has not been used before.
+	"""
+	if not state or not session_id:
+		return False
+
+	parts = state.split(".")
+	if len(parts) != 3:
+		return False
+	payload = u"%s.%s" % (parts[0], parts[1])
+
+	try:
+		issued_ms = long(parts[0])
+		received = JBase64.getUrlDecoder().decode(parts[2])
+	except (ValueError, IllegalArgumentException):
+		return False
+
+	now_ms = System.currentTimeMillis()
+	if now_ms - issued_ms > _STATE_TTL_MS:
+		return False
+	key = _get_state_key(root_tag_path)
+	if not MessageDigest.isEqual(_state_mac(key, root_tag_path, session_id, payload), received):
+		return False
+	return _consume_state_nonce(parts[1], now_ms)
+
 # ===========================================================
 # Unified Provider (UseSA Boolean Choice)
 # ===========================================================
@@ -532,19 +868,40 @@ class GoogleAuthProvider(object):
 
 	def __init__(self, root_tag_path):
 		self.root_tag_path = root_tag_path
-		self.oauth_client = GoogleOAuthClient(root_tag_path)
-		self.sa_client = GoogleServiceAccountClient(root_tag_path)
+		# Only the client selected by UseSA is built, on first use.
+		self.oauth_client = None
+		self.sa_client = None
 
-	def get_valid_access_token(self):												# Modify with your enviroment
-		use_sa = system.tag.readBlocking(										# Modify with your enviroment
-			[u"%s/UseSA" % self.root_tag_path]									# Modify with your enviroment
-		)[0].value																# Modify with your enviroment
+	def _get_client(self, use_sa):
+		if use_sa:
+			if self.sa_client is None:
+				self.sa_client = GoogleServiceAccountClient(self.root_tag_path)
+			return self.sa_client
+		if self.oauth_client is None:
+			self.oauth_client = GoogleOAuthClient(self.root_tag_path)
+		return self.oauth_client
 
+	def get_valid_access_token(self):
 		# debug: https://oauth2.googleapis.com/tokeninfo?access_token=		
+		# Common case: a dict lookup and a timestamp compare, no DataSet read.
+		token = _get_cached_token(self._get_client(_get_use_sa(self.root_tag_path)).tag_path)
+		if token:
+			return token
+
+		# Cache miss (about once per token lifetime): UseSA and both credential
+		# DataSets in one gateway round trip, the selected client then works on
+		# the pre-fetched value.
+		use_sa_qv, oauth_qv, sa_qv = system.tag.readBlocking([						# Modify with your enviroment
+			u"%s/UseSA" % self.root_tag_path,										# Modify with your enviroment
+			u"%s/OAuthClient" % self.root_tag_path,									# Modify with your enviroment
+			u"%s/ServiceAccount" % self.root_tag_path,								# Modify with your enviroment
+		])
+		use_sa = bool(use_sa_qv.value)
+		_cache_use_sa(self.root_tag_path, use_sa)
+
 		if use_sa:
-			return self.sa_client.get_valid_access_token()
-		else:
-			return self.oauth_client.get_valid_access_token()
+			return self._get_client(True).get_valid_access_token(sa_qv)
+		return self._get_client(False).get_valid_access_token(oauth_qv)
 
 
 	
\ No newline at end of file
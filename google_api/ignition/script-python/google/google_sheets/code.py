@@ -9,10 +9,23 @@
 from google.auth import GoogleAuthProvider
 from collections import OrderedDict
 
+from java.io import ByteArrayInputStream, ByteArrayOutputStream
+from java.lang import System
+from java.util.concurrent import Callable, Executors
+from java.util.zip import GZIPInputStream
+
 SHEETS_APPEND_URL = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values/%s:append"
 SHEETS_GET_URL = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values/%s"
 SHEETS_UPDATE_URL = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values/%s"
 SHEETS_CLEAR_URL  = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values/%s:clear"
+SHEETS_BATCH_GET_URL = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values:batchGet?majorDimension="
+SHEETS_BATCH_UPDATE_URL = u"https://sheets.googleapis.com/v4/spreadsheets/%s/values:batchUpdate"
+
+BEARER_PREFIX = u"Bearer "		# Authorization header value = BEARER_PREFIX + token
+GZIP_USER_AGENT = u"ignition-google-api (gzip)"	# Google only gzips responses when the User-Agent contains "gzip"
+
+MAX_CONCURRENT_REQUESTS = 8		# thread pool cap for the *_many helpers
+HEADER_CACHE_TTL_MS = 60000		# how long a header row read by the dict helpers is reused
 
 class GoogleSheetsClient(object):
 	"""
@@ -33,6 +46,7 @@ class GoogleSheetsClient(object):
 	- Update ranges
 	- Clear ranges
 	- Batch get / batch update
+	- Parallel get / append over several ranges
 	- Header-based dictionary append helper
 	"""
 
@@ -44,6 +58,8 @@ class GoogleSheetsClient(object):
 		"""
 		self.root_tag_path = root_tag_path
 		self.spreadsheet_id = spreadsheet_id
+		self._auth = None		# GoogleAuthProvider, created on first request
+		self._header_cache = {}	# {(sheet_name, header_row_index): (expiry_epoch_ms, [column names])}
 		
 	# ------------------------------------------------------------------
 	# Internal helper
@@ -51,11 +67,98 @@ class GoogleSheetsClient(object):
 	def _get_http_client_and_token(self):
 		"""
 		Internal helper to get a ready-to-use httpClient and valid access_token.
+		
+		The auth provider is built once per GoogleSheetsClient and keeps handing
+		out the cached token until it expires. The httpClient is shared by every
+		GoogleSheetsClient in this module (see _get_http).
+		"""
+		if self._auth is None:
+			self._auth = GoogleAuthProvider(self.root_tag_path)
+		token = self._auth.get_valid_access_token()
+		return _get_http(), token
+
+	def _get_header(self, sheet_name, header_row_index, fresh=False):
+		"""
+		Return the header row as a list of column names (A, B, C, ... order).
+		
+		The header is reused by later dict operations for HEADER_CACHE_TTL_MS.
+		Other users may edit the sheet meanwhile, so anything that writes the
+		header back (append_dict_rows / update_dict_rows expanding it) asks for
+		a fresh read instead of trusting the cached copy.
+		
+		Args:
+			fresh (bool): If True, skip the cache and read the sheet.
 		"""
-		authClient = GoogleAuthProvider(self.root_tag_path)
-		token = authClient.get_valid_access_token()
-		client = system.net.httpClient(timeout=10000)
-		return client, token
+		key = (sheet_name, header_row_index)
+		if not fresh:
+			columns = self._get_cached_header(key)
+			if columns is not None:
+				return columns
+
+		header_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, header_row_index)
+		header_values, _ = self._get_rows_raw(header_range)		# [["col1", "col2", ...]]
+		columns = list(header_values[0]) if header_values else []
+
+		self._cache_header(key, columns)
+		return columns
+
+	def _get_cached_header(self, key):
+		"""Cached header columns for key, or None if missing/expired."""
+		cached = self._header_cache.get(key)
+		if cached is not None and System.currentTimeMillis() < cached[0]:
+			return cached[1]
+		return None
+
+	def _cache_header(self, key, columns):
+		# An empty header is not cached: the sheet may get one at any time.
+		if columns:
+			self._header_cache[key] = (System.currentTimeMillis() + HEADER_CACHE_TTL_MS, list(columns))
+		else:
+			self._header_cache.pop(key, None)
+
+	def _batch_get_value_ranges(self, ranges_a1, major_dimension="ROWS"):
+		"""
+		values.batchGet returning the raw valueRanges in request order.
+		
+		The response 'range' keys are normalized by Google (e.g. "A1:ZZ1" comes
+		back as "A1:D1"), so callers that need to match results to requests use
+		this order instead of the keys.
+		"""
+		client, token = self._get_http_client_and_token()
+		
+		# Build query params: majorDimension=...&ranges=...&ranges=...
+		# Manually build query string to avoid encoding issues
+		url = (SHEETS_BATCH_GET_URL % self.spreadsheet_id) + major_dimension
+		if ranges_a1:
+			url += u"&ranges=" + u"&ranges=".join(ranges_a1)
+		
+		logger = system.util.getLogger("google-sheets-batch-get")
+		debug = logger.isDebugEnabled()		# bodies can be MBs; only format them when asked for
+		if debug:
+			logger.debug(u"BATCH GET url = %s" % url)
+		
+		resp = client.get(
+			url=url,
+			headers={
+				"Authorization": BEARER_PREFIX + token,
+				"Accept-Encoding": "gzip",
+				"User-Agent": GZIP_USER_AGENT,
+			},
+			timeout=10000,
+		)
+		
+		status = resp.getStatusCode()
+		text = _read_text(resp)
+		
+		if debug:
+			logger.debug(u"BATCH GET status = %s" % status)
+			logger.debug(u"BATCH GET body   = %s" % text)
+		
+		if status != 200:
+			raise Exception("values.batchGet failed: %s %s" % (status, text))
+		
+		data = _json_decode(text)
+		return data.get("valueRanges", []) or []
 
 	# ------------------------------------------------------------------
 	# Basic values API: Spreadsheet Resource
@@ -73,20 +176,24 @@ class GoogleSheetsClient(object):
 		
 		resp = client.get(
 			url=url,
-			headers={u"Authorization": "Bearer %s" % token}
+			headers={
+				u"Authorization": BEARER_PREFIX + token,
+				u"Accept-Encoding": u"gzip",
+				u"User-Agent": GZIP_USER_AGENT,
+			}
 		)
 
 		status = resp.getStatusCode()
-		jsonResult = resp.getJson()
+		text = _read_text(resp)
 
 #		logger = system.util.getLogger("google-sheets-resource")
 #		logger.info(u"GET RESOURCE status = %s" % status)
-#		logger.info(u"GET RESOURCE result   = %s" % jsonResult)
+#		logger.info(u"GET RESOURCE result   = %s" % text)
 
 		if status != 200:
-			raise Exception(u"spreadsheets.get failed: %s %s" % (status, jsonResult))
+			raise Exception(u"spreadsheets.get failed: %s %s" % (status, text))
 
-		return jsonResult
+		return _json_decode(text)
 
 	def get_sheet_name_id_map(self):
 		"""
@@ -123,28 +230,23 @@ class GoogleSheetsClient(object):
 		
 		Args:
 			range_a1 (str): A1 notation, (e.g. "Sheet1!A1:D100").
+							Used as-is, so pass it without surrounding whitespace.
 		
 		Returns:
-			list[list]: 2D list of values (e.g. {"A": ..., "B": ..., ...}).
+			list[OrderedDict]: One OrderedDict per row (e.g. {"A": ..., "B": ..., ...}).
+							   Keys are inserted left to right, so iteration order is
+							   already A, B, ..., Z, AA, AB, ...; callers can use
+							   list(row.keys()) without sorting.
 		"""
 		client, token = self._get_http_client_and_token()
-		
-#		encoded_range = urllib.quote(range_a1.encode("utf-8"))
-		encoded_range = range_a1.strip()
-		url = SHEETS_GET_URL % (self.spreadsheet_id, encoded_range)
+		return self._get_rows(client, token, range_a1)
 
-		resp = client.get(
-			url=url,
-			headers={"Authorization": "Bearer %s" % token},
-		)
-
-		status = resp.getStatusCode()
-		jsonResult = resp.getJson()
-
-		if status != 200:
-			raise Exception("Sheets GET failed: %s %s %s" % (url, status, jsonResult))
-
-		values = jsonResult.get("values", []) or []
+	def _get_rows(self, client, token, range_a1):
+		"""
+		get_rows body with an already resolved httpClient and token,
+		so it can run on worker threads (see get_rows_many).
+		"""
+		values, width = self._get_rows_raw(range_a1, client, token)
 	
 		result = []
 #		for row in values:
@@ -154,15 +256,51 @@ class GoogleSheetsClient(object):
 #				row_dict[col_letter] = cell
 #			result.append(row_dict)
 			
+		# Column letters for the widest row, looked up once per call.
+		col_letters = [_to_column_letters(i) for i in range(1, width + 1)]		# 1→A, 2→B, ...
+		
 		for row in values:
 			od = OrderedDict()
 			for idx, cell in enumerate(row):
-				col_letter = _to_column_letters(idx + 1)  # 1→A, 2→B, ...
-				od[col_letter] = cell
+				od[col_letters[idx]] = cell
 			result.append(od)
 			
 		return result
 
+	def _get_rows_raw(self, range_a1, client=None, token=None):
+		"""
+		Fast path for internal callers: values.get without re-keying rows by
+		column letter.
+		
+		Returns:
+			(list[list], int): Rows as returned by the API, and the widest row's length.
+		"""
+		if client is None:
+			client, token = self._get_http_client_and_token()
+
+#		encoded_range = urllib.quote(range_a1.encode("utf-8"))
+		encoded_range = range_a1
+		url = SHEETS_GET_URL % (self.spreadsheet_id, encoded_range)
+
+		resp = client.get(
+			url=url,
+			headers={
+				"Authorization": BEARER_PREFIX + token,
+				"Accept-Encoding": "gzip",
+				"User-Agent": GZIP_USER_AGENT,
+			},
+		)
+
+		status = resp.getStatusCode()
+		text = _read_text(resp)
+
+		if status != 200:
+			raise Exception("Sheets GET failed: %s %s %s" % (url, status, text))
+
+		values = _json_decode(text).get("values", []) or []
+		width = max([len(row) for row in values]) if values else 0
+		return values, width
+
 	def append_rows(self, range_a1, values, value_input_option="USER_ENTERED"):
 		"""
 		Append one or more rows to the Sheet using values.append.
@@ -171,6 +309,7 @@ class GoogleSheetsClient(object):
 			range_a1 (str): A1 notation, e.g. "Sheet1" or "Sheet1!A1".
 							If only sheet name is given (e.g. "Sheet1"),
 							rows are appended to the end of the sheet.
+							Used as-is, so pass it without surrounding whitespace.
 		    values (list[list]): 2D list, each inner list is a row.
 		    value_input_option (str): "USER_ENTERED"(Numbers will stay as numbers, but strings may be converted to numbers, dates, etc.)
 		    						 or "RAW"(not be parsed and will be stored as-is).
@@ -179,14 +318,20 @@ class GoogleSheetsClient(object):
 			dict: Parsed JSON response.
 		"""
 		client, token = self._get_http_client_and_token()
-		
+		return self._append_rows(client, token, range_a1, values, value_input_option)
+
+	def _append_rows(self, client, token, range_a1, values, value_input_option):
+		"""
+		append_rows body with an already resolved httpClient and token,
+		so it can run on worker threads (see append_rows_many).
+		"""
 #		encoded_range = urllib.quote(range_a1.encode("utf-8"))		
-		encoded_range = range_a1.strip()
+		encoded_range = range_a1
 		url = SHEETS_APPEND_URL % (self.spreadsheet_id, encoded_range)
-		url += u"?valueInputOption=%s&insertDataOption=OVERWRITE" % value_input_option
+		url += u"?valueInputOption=%s&insertDataOption=OVERWRITE&includeValuesInResponse=false" % value_input_option
 
 		payload = {"values": values}
-		body = system.util.jsonEncode(payload)
+		body = _json_encode(payload)
 #		logger = system.util.getLogger("google-sheets-append")
 #		logger.info(u"POST url    = %s" % url)
 #		logger.info(u"POST payload    = %s" % payload)
@@ -195,18 +340,55 @@ class GoogleSheetsClient(object):
 			url=url,
 			data=body,
 			headers={
-				"Authorization": "Bearer %s" % token,
+				"Authorization": BEARER_PREFIX + token,
 				"Content-Type": "application/json",
 			}
 		)
 
 		status = resp.getStatusCode()
-		jsonResult = resp.getJson()
+		text = resp.getText()
 
 		if status not in (200, 201):
-			raise Exception("Sheets APPEND failed: %s %s %s" % (url, status, jsonResult))
+			raise Exception("Sheets APPEND failed: %s %s %s" % (url, status, text))
+
+		return _json_decode(text)
 
-		return jsonResult
+	# ------------------------------------------------------------------
+	# Concurrent values API: many get / append
+	# ------------------------------------------------------------------
+	def get_rows_many(self, ranges_a1):
+		"""
+		Run get_rows for several ranges in parallel.
+		
+		Useful when ranges live on different sheets and their latency would
+		otherwise add up. The token is resolved once and shared by all requests.
+		
+		Args:
+			ranges_a1 (list[str]): A1 ranges, e.g. ["Sheet1!A1:D10", "test!A1:C5"].
+		
+		Returns:
+			list[list[OrderedDict]]: get_rows result per range, in input order.
+		"""
+		client, token = self._get_http_client_and_token()
+		return _run_concurrently(
+			[(self._get_rows, (client, token, r)) for r in ranges_a1]
+		)
+
+	def append_rows_many(self, items, value_input_option="USER_ENTERED"):
+		"""
+		Run append_rows for several ranges in parallel.
+		
+		Args:
+			items (list[tuple]): [(range_a1, values), ...], see append_rows.
+			value_input_option (str): "USER_ENTERED" or "RAW".
+		
+		Returns:
+			list[dict]: append_rows response per item, in input order.
+		"""
+		client, token = self._get_http_client_and_token()
+		return _run_concurrently(
+			[(self._append_rows, (client, token, r, v, value_input_option)) for r, v in items]
+		)
 		
 	def update_rows(self, range_a1, values, value_input_option="USER_ENTERED"):
 		"""
@@ -214,6 +396,7 @@ class GoogleSheetsClient(object):
 		
 		Args:
 			range_a1 (str): A1 notation, (e.g. "Sheet1!A2:B10").
+							Used as-is, so pass it without surrounding whitespace.
 			values   (list[list]): 2D list, each inner list is a row.
 			value_input_option (str): "USER_ENTERED" or "RAW".
 		
@@ -222,38 +405,41 @@ class GoogleSheetsClient(object):
 		"""
 		client, token = self._get_http_client_and_token()
 		
-		# Use the given A1 range as-is (no manual URL encoding).
-		encoded_range = range_a1.strip()
+		# Use the given A1 range as-is (no manual URL encoding, no strip).
+		encoded_range = range_a1
 		
 		# Build URL for values.update
 		url = SHEETS_UPDATE_URL % (self.spreadsheet_id, encoded_range)
 		url += "?valueInputOption=%s" % value_input_option
 		
 		payload = {"values": values}
-		body = system.util.jsonEncode(payload)
+		body = _json_encode(payload)
 		
 		logger = system.util.getLogger("google-sheets-update")
-		logger.info(u"UPDATE url    = %s" % url)
-		logger.info(u"UPDATE values = %s" % values)
+		debug = logger.isDebugEnabled()
+		if debug:
+			logger.debug(u"UPDATE url    = %s" % url)
+			logger.debug(u"UPDATE values = %s" % values)
 		
 		resp = client.put(
 			url=url,
 			data=body,
 			headers={
-				"Authorization": "Bearer %s" % token,
+				"Authorization": BEARER_PREFIX + token,
 				"Content-Type": "application/json",
 			}
 		)
 
 		status = resp.getStatusCode()
 		text = resp.getText()
-		logger.info(u"UPDATE status = %s" % status)
-		logger.info(u"UPDATE body   = %s" % text)
+		if debug:
+			logger.debug(u"UPDATE status = %s" % status)
+			logger.debug(u"UPDATE body   = %s" % text)
 
 		if status != 200:
 			raise Exception("Sheets UPDATE failed: %s %s %s" % (url, status, text))
 
-		return resp.getJson()
+		return _json_decode(text)
 		
 	def clear_rows(self, range_a1):
 		"""
@@ -261,39 +447,43 @@ class GoogleSheetsClient(object):
 		
 		Args:
 		    range_a1 (str): A1 notation, e.g. "Sheet1!A2:B100".
+		    				Used as-is, so pass it without surrounding whitespace.
 		
 		Returns:
 		    dict: Parsed JSON response from the API.
 		"""
 		client, token = self._get_http_client_and_token()
 		
-		encoded_range = range_a1.strip()
+		encoded_range = range_a1
 		url = SHEETS_CLEAR_URL % (self.spreadsheet_id, encoded_range)
 		
 		logger = system.util.getLogger("google-sheets-clear")
-		logger.info(u"CLEAR url  = %s" % url)
+		debug = logger.isDebugEnabled()
+		if debug:
+			logger.debug(u"CLEAR url  = %s" % url)
 		
 		# values.clear expects an empty JSON body.
-		body = system.util.jsonEncode({})
+		body = u"{}"
 		
 		resp = client.post(
 			url=url,
 			data=body,
 			headers={
-				"Authorization": "Bearer %s" % token,
+				"Authorization": BEARER_PREFIX + token,
 				"Content-Type": "application/json",
 			}
         	)
 
 		status = resp.getStatusCode()
 		text = resp.getText()
-		logger.info(u"CLEAR status = %s" % status)
-		logger.info(u"CLEAR body   = %s" % text)
+		if debug:
+			logger.debug(u"CLEAR status = %s" % status)
+			logger.debug(u"CLEAR body   = %s" % text)
 		
 		if status != 200:
 			raise Exception("Sheets CLEAR failed: %s %s %s" % (url, status, text))
 		
-		return resp.getJson()
+		return _json_decode(text)
 
 	def batch_get(self, ranges_a1, major_dimension="ROWS"):
 		"""
@@ -310,38 +500,7 @@ class GoogleSheetsClient(object):
 				...
 			}
 		"""
-		client, token = self._get_http_client_and_token()
-		
-		# Build query params: ranges=...&ranges=...
-		base_url = "https://sheets.googleapis.com/v4/spreadsheets/%s/values:batchGet" % self.spreadsheet_id
-		
-		# Manually build query string to avoid encoding issues
-		params = ["majorDimension=%s" % major_dimension]
-		for r in ranges_a1:
-			params.append("ranges=%s" % r)
-		
-		url = base_url + "?" + "&".join(params)
-		
-		logger = system.util.getLogger("google-sheets-batch-get")
-		logger.info(u"BATCH GET url = %s" % url)
-		
-		resp = client.get(
-			url=url,
-			headers={"Authorization": "Bearer %s" % token},
-			timeout=10000,
-		)
-		
-		status = resp.getStatusCode()
-		text = resp.getText()
-		
-		logger.info(u"BATCH GET status = %s" % status)
-		logger.info(u"BATCH GET body   = %s" % text)
-		
-		if status != 200:
-			raise Exception("values.batchGet failed: %s %s" % (status, text))
-		
-		data = resp.getJson()
-		value_ranges = data.get("valueRanges", []) or []
+		value_ranges = self._batch_get_value_ranges(ranges_a1, major_dimension)
 		
 		result = {}
 		for vr in value_ranges:
@@ -369,24 +528,27 @@ class GoogleSheetsClient(object):
 		"""
 		client, token = self._get_http_client_and_token()
 		
-		url = "https://sheets.googleapis.com/v4/spreadsheets/%s/values:batchUpdate" % self.spreadsheet_id
+		url = SHEETS_BATCH_UPDATE_URL % self.spreadsheet_id
 		
 		body_obj = {
 			"valueInputOption": value_input_option,
 			"data": data_items,
+			"includeValuesInResponse": False,		# only counts come back, not the written cells
 		}
 		
-		body = system.util.jsonEncode(body_obj)
+		body = _json_encode(body_obj)
 		
 		logger = system.util.getLogger("google-sheets-batch-update")
-		logger.info(u"BATCH UPDATE url  = %s" % url)
-		logger.info(u"BATCH UPDATE body = %s" % body)
+		debug = logger.isDebugEnabled()
+		if debug:
+			logger.debug(u"BATCH UPDATE url  = %s" % url)
+			logger.debug(u"BATCH UPDATE body = %s" % body)
 		
 		resp = client.post(
 			url=url,
 			data=body,
 			headers={
-				"Authorization": "Bearer %s" % token,
+				"Authorization": BEARER_PREFIX + token,
 				"Content-Type": "application/json",
 			},
 			timeout=10000,
@@ -395,17 +557,22 @@ class GoogleSheetsClient(object):
 		status = resp.getStatusCode()
 		text = resp.getText()
 		
-		logger.info(u"BATCH UPDATE status = %s" % status)
-		logger.info(u"BATCH UPDATE resp   = %s" % text)
+		if debug:
+			logger.debug(u"BATCH UPDATE status = %s" % status)
+			logger.debug(u"BATCH UPDATE resp   = %s" % text)
 		
 		if status != 200:
 			raise Exception("values.batchUpdate failed: %s %s" % (status, text))
 		
-		return resp.getJson()
+		return _json_decode(text)
 
 	def get_dict_rows(self, sheet_name, header_row_index=1, start_row=2, end_row=None):
 		"""
 		Read rows as list[dict] using a header row.
+		
+		Header and data are fetched in one values.get call spanning from the
+		header row to end_row; if the header is already cached on this client
+		only the data range is requested.
 
 		Args:
 			sheet_name (str): Sheet name, e.g. "Sheet1".
@@ -418,41 +585,51 @@ class GoogleSheetsClient(object):
 		"""
 		logger = system.util.getLogger("google-sheets-get-dict")
 		
-		# 1) Read header (A,B,C,... dict)
-		header_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, header_row_index)
-		header_rows = self.get_rows(header_range)
+		key = (sheet_name, header_row_index)
+		columns = self._get_cached_header(key)
 		
-		if header_rows and len(header_rows) > 0:
-			header_dict = header_rows[0]											# e.g. OrderedDict("A": "col1", "B": "col2", ...)
-#			col_letters = sorted(header_dict.keys(), key=lambda x: (len(x), x))		# A..Z,AA..AZ...
-			col_letters = list(header_dict.keys())									# preserve order
-			columns = [header_dict[c] for c in col_letters]
+		# The last header column is not known before the header is read,
+		# so the data range spans A..ZZ and rows are cut to the header width.
+		if end_row is None:
+			data_range = u"%s!A%d:ZZ" % (sheet_name, start_row)
 		else:
-			col_letters = []
-			columns = []
+			data_range = u"%s!A%d:ZZ%d" % (sheet_name, start_row, end_row)
+		
+		if columns is None and start_row > header_row_index:
+			# Header row first, data (start_row - header_row_index) rows below it.
+			# Only trailing empty rows are dropped by the API, so values[0] is the header.
+			if end_row is None:
+				full_range = u"%s!A%d:ZZ" % (sheet_name, header_row_index)
+			else:
+				full_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, end_row)
+			values, _ = self._get_rows_raw(full_range)
+			columns = list(values[0]) if values else []
+			self._cache_header(key, columns)
+			data_rows = values[start_row - header_row_index:]
+		elif columns is None:
+			# Header below the first data row: read both ranges in one batchGet.
+			header_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, header_row_index)
+			header_vr, data_vr = self._batch_get_value_ranges([header_range, data_range])
+			header_values = header_vr.get("values", []) or []
+			columns = list(header_values[0]) if header_values else []
+			self._cache_header(key, columns)
+			data_rows = data_vr.get("values", []) or []
+		else:
+			data_rows, _ = self._get_rows_raw(data_range)		# list of lists, one per sheet row
 
 		if not columns:
 			logger.info(u"get_dict_rows: header not found, returning empty list.")
 			return []
 
-		# 2) Read data region using actual last header column letter
-		last_col_letter = col_letters[-1]
-		if end_row is None:
-			data_range = u"%s!A%d:%s" % (sheet_name, start_row, last_col_letter)
-		else:
-			data_range = u"%s!A%d:%s%d" % (sheet_name, start_row, last_col_letter, end_row)
-
-		data_rows = self.get_rows(data_range)  # list of dicts keyed by column letters # e.g. list[OrderedDict("A"->..., "B"->..., ...)]
-
 		result = []
 		
-		for row_dict_letters in data_rows:
-#			row_by_header = {}
-			row_by_header = OrderedDict()
-			for idx, header_name in enumerate(columns):
-				col_letter = col_letters[idx]
-				value = row_dict_letters.get(col_letter, u"")
-				row_by_header[header_name] = value
+		width = len(columns)
+		
+		for row in data_rows:
+			# Pad short rows (trailing empty cells are omitted by the API);
+			# zip drops cells beyond the header width.
+			row = list(row)
+			row_by_header = OrderedDict(zip(columns, row + [u""] * (width - len(row))))
 			result.append(row_by_header)
 
 		return result
@@ -473,49 +650,23 @@ class GoogleSheetsClient(object):
 		"""
 		logger = system.util.getLogger("google-sheets-append-dict")
 		
-		# 1) Read the header row
-		header_range = u"%s!A%d:ZZ%d" % (
-			sheet_name,
-			header_row_index,
-			header_row_index,
-		)
-
-		header_rows = self.get_rows(header_range)  # list[{"A": "col1", "B": "col2", ...}]
-		
-		if header_rows and len(header_rows) > 0:
-			header_dict = header_rows[0]
-			# Order By A,B,...,Z,AA,...
-			col_letters = sorted(header_dict.keys(), key=lambda x: (len(x), x))
-			header_row = [header_dict[c] for c in col_letters]
-		else:
-			col_letters = []
-			header_row = []
-		
-		columns = list(header_row)
-		
-		# Ensure "t_stamp" column exists if requested
-		if add_t_stamp and "t_stamp" not in columns:
-			columns.append("t_stamp")
+		# 1) Read the header row (cached per client)
+		key = (sheet_name, header_row_index)
+		header_row = self._get_header(sheet_name, header_row_index)
 		
 		# 2) Build rows according to header columns, auto-expanding columns for new keys
-		all_rows = []
 		now = system.date.now().getTime()  # Store as Milliseconds; customize format if desired
+		columns, all_rows = _rows_by_header(header_row, dict_rows, add_t_stamp, now)
 		
-		for d in dict_rows:
-			row_dict = dict(d)  # shallow copy
-			if add_t_stamp:
-				row_dict["t_stamp"] = now
-		
-			# Ensure header has all keys
-			for key in row_dict.keys():
-				if key not in columns:
-					columns.append(key)
-		
-			# Build row aligned to current columns
-			row = [row_dict.get(col, "") for col in columns]
-			all_rows.append(row)
-		
-		# 3) If we expanded columns beyond original header, update the header row via update_range
+		if len(columns) > len(header_row):
+			# The header is about to be written back: rebuild against the current
+			# sheet header, a cached copy may miss columns added by someone else.
+			header_row = self._get_header(sheet_name, header_row_index, fresh=True)
+			columns, all_rows = _rows_by_header(header_row, dict_rows, add_t_stamp, now)
+		
+		# 3) If we expanded columns beyond original header, update the header row via update_rows
+		#    (values.append cannot be part of a values.batchUpdate, so this stays a separate call
+		#    and is only made when the header actually grew)
 		if len(columns) > len(header_row):
 			# compute end column letter (A, B, ..., Z, AA, AB, ..., ZZ) for simplicity up to 26*2
 			col_letters_for_header = _to_column_letters(len(columns))
@@ -523,11 +674,12 @@ class GoogleSheetsClient(object):
 			header_update_range = u"%s!A%d:%s%d" % (
 			    sheet_name,
 			    header_row_index,
-			    col_letters,
+			    col_letters_for_header,
 			    header_row_index,
 			)
 		
-			self.update_range(header_update_range, [columns])
+			self.update_rows(header_update_range, [columns])
+			self._cache_header(key, columns)
 		
 		# 4) Append the rows at the bottom of the sheet
 		#    We use "sheetName" only (no row index), so Sheets appends at the end.
@@ -549,55 +701,25 @@ class GoogleSheetsClient(object):
 			add_t_stamp (bool): If True, add/overwrite 't_stamp' column.
 
 		Returns:
-			dict: Sheets API response from values.update.
+			dict: Sheets API response from values.update (the data block's
+				  entry of the values.batchUpdate response if the header was expanded).
 		"""
 		logger = system.util.getLogger("google-sheets-update-dict")
 
-		# 1) Read header
-		header_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, header_row_index)
-		header_rows = self.get_rows(header_range)
-
-		if header_rows and len(header_rows) > 0:
-			header_dict = header_rows[0]
-			col_letters = sorted(header_dict.keys(), key=lambda x: (len(x), x))
-			header_row = [header_dict[c] for c in col_letters]
-		else:
-			col_letters = []
-			header_row = []
-	
-		columns = list(header_row)
-
-		if add_t_stamp and "t_stamp" not in columns:
-			columns.append("t_stamp")
+		# 1) Read header (cached per client)
+		key = (sheet_name, header_row_index)
+		header_row = self._get_header(sheet_name, header_row_index)
 
 		# 2) Merge keys from dict_rows
 		now = system.date.now().getTime()  # Store as Milliseconds; customize format if desired
-		rows_values = []
-
-		for d in dict_rows:
-			row_dict = dict(d)
-			if add_t_stamp:
-				row_dict["t_stamp"] = now
-
-			for key in row_dict.keys():
-				if key not in columns:
-					columns.append(key)
-
-			row = [row_dict.get(col, u"") for col in columns]
-			rows_values.append(row)
+		columns, rows_values = _rows_by_header(header_row, dict_rows, add_t_stamp, now)
 
-		# 3) If header expanded, write it back
 		if len(columns) > len(header_row):
-			col_letters_for_header = _to_column_letters(len(columns))
-			header_update_range = u"%s!A%d:%s%d" % (
-				sheet_name,
-				header_row_index,
-				col_letters_for_header,
-				header_row_index,
-			)
-			self.update_rows(header_update_range, [columns])
+			# Header will be written back: re-read it instead of trusting the cache.
+			header_row = self._get_header(sheet_name, header_row_index, fresh=True)
+			columns, rows_values = _rows_by_header(header_row, dict_rows, add_t_stamp, now)
 
-		# 4) Update data block
+		# 3) Data block range
 		end_row = start_row + len(rows_values) - 1
 		col_letters_for_data = _to_column_letters(len(columns))
 		update_range = u"%s!A%d:%s%d" % (
@@ -608,6 +730,25 @@ class GoogleSheetsClient(object):
 		)
 
 #		logger.info(u"UPDATE_DICT range = %s" % update_range)
+
+		# 4) If header expanded, write it back together with the data block
+		#    in one values.batchUpdate call instead of two values.update calls
+		if len(columns) > len(header_row):
+			header_update_range = u"%s!A%d:%s%d" % (
+				sheet_name,
+				header_row_index,
+				col_letters_for_data,
+				header_row_index,
+			)
+			result = self.batch_update_values([
+				{"range": header_update_range, "values": [columns]},
+				{"range": update_range, "values": rows_values},
+			])
+			self._cache_header(key, columns)
+			responses = result.get("responses", []) or []
+			return responses[-1] if responses else result
+
+		# 5) Update data block
 		return self.update_rows(update_range, rows_values)
 
 	def clear_dict_rows(self, sheet_name, header_row_index, start_row, end_row):
@@ -625,15 +766,8 @@ class GoogleSheetsClient(object):
 		"""
 		logger = system.util.getLogger("google-sheets-clear-dict")
 
-		# 1) Read header to know how many columns are in use
-		header_range = u"%s!A%d:ZZ%d" % (sheet_name, header_row_index, header_row_index)
-		header_rows = self.get_rows(header_range)
-		
-		if header_rows and len(header_rows) > 0:
-			header_dict = header_rows[0]
-			columns = [header_dict[c] for c in sorted(header_dict.keys(), key=lambda x: (len(x), x))]
-		else:
-			columns = []
+		# 1) Read header (cached per client) to know how many columns are in use
+		columns = self._get_header(sheet_name, header_row_index)
 
 		if not columns:
 			# no header ⇒ nothing to clear for dict-based region
@@ -648,14 +782,15 @@ class GoogleSheetsClient(object):
 			end_row,
 		)
 
-		logger.info(u"CLEAR_DICT range = %s" % clear_range)
+		if logger.isDebugEnabled():
+			logger.debug(u"CLEAR_DICT range = %s" % clear_range)
 		return self.clear_rows(clear_range)
 
 
 # ----------------------------------------------------------------------
 # Helper to convert column index to Excel-style letters
 # ----------------------------------------------------------------------		
-def _to_column_letters(n):
+def _compute_column_letters(n):
 	"""
 	Convert 1-based column index to Excel-style column letters.
 	Example:
@@ -663,11 +798,168 @@ def _to_column_letters(n):
 		26 -> "Z"
 		27 -> "AA"
 		28 -> "AB"
-	Supports up to 702 ("ZZ"), which is typically enough.
 	"""
 	n = int(n)
 	letters = []
 	while n > 0:
 		n, rem = divmod(n - 1, 26)					# n: quotient, rem: remainder
-		letters.insert(0, chr(ord("A") + rem))		# eg. ord("A") -> 65, chr(65 + 1) -> "B", n==28 -> letters = [] -> [B] -> [AB]
-	return "".join(letters)
\ No newline at end of file
+		letters.append(chr(ord("A") + rem))			# least significant first, eg. n==28 -> [B] -> [B, A]
+	letters.reverse()								# -> [A, B]
+	return "".join(letters)
+
+# Index 0 is unused so that _COL_LETTERS[n] is the letter(s) of column n.
+_COL_LETTERS = [None] + [_compute_column_letters(i) for i in range(1, 703)]	# A .. ZZ
+
+def _to_column_letters(n):
+	"""
+	Convert 1-based column index to Excel-style column letters (1 -> "A", 28 -> "AB").
+	
+	Up to 702 ("ZZ") this is a table lookup; wider indexes are computed.
+	"""
+	n = int(n)
+	if 0 < n < len(_COL_LETTERS):
+		return _COL_LETTERS[n]
+	return _compute_column_letters(n)
+
+
+# ----------------------------------------------------------------------
+# Helper to lay out dict rows along a header row
+# ----------------------------------------------------------------------
+def _rows_by_header(header_row, dict_rows, add_t_stamp, now):
+	"""
+	Build value rows for dict_rows aligned to header_row.
+	
+	Keys missing from the header are appended as new columns (in first-seen
+	order), as is "t_stamp" when add_t_stamp is set.
+	
+	Returns:
+		(list, list[list]): (columns, rows); columns is longer than header_row
+		if the header has to be expanded.
+	"""
+	columns = list(header_row)
+	
+	# Ensure "t_stamp" column exists if requested
+	if add_t_stamp and "t_stamp" not in columns:
+		columns.append("t_stamp")
+	
+	col_index = dict([(name, idx) for idx, name in enumerate(columns)])
+	rows = []
+	
+	for d in dict_rows:
+		# Row aligned to current columns; only the keys present in d are placed.
+		row = [u""] * len(columns)
+		for key, value in d.items():
+			idx = col_index.get(key)
+			if idx is None:
+				# Ensure header has all keys
+				idx = len(columns)
+				columns.append(key)
+				col_index[key] = idx
+				row.append(u"")
+			row[idx] = value
+		if add_t_stamp:
+			row[col_index["t_stamp"]] = now
+		rows.append(row)
+	
+	return columns, rows
+
+# ----------------------------------------------------------------------
+# Shared HTTP client
+# ----------------------------------------------------------------------
+_HTTP_CLIENT = None
+
+def _get_http():
+	"""
+	Return the module-wide system.net.httpClient, creating it on first use.
+	
+	All requests go to sheets.googleapis.com, so one client (and its
+	connection pool) lets every GoogleSheetsClient, and the *_many worker
+	threads, reuse the same keep-alive TLS connections.
+	"""
+	global _HTTP_CLIENT
+	if _HTTP_CLIENT is None:
+		_HTTP_CLIENT = system.net.httpClient(timeout=10000)		# ms
+	return _HTTP_CLIENT
+
+# ----------------------------------------------------------------------
+# Concurrency helpers
+# ----------------------------------------------------------------------
+class _Task(Callable):
+	"""java.util.concurrent.Callable wrapper around fn(*args)."""
+	def __init__(self, fn, args):
+		self.fn = fn
+		self.args = args
+
+	def call(self):
+		return self.fn(*self.args)
+
+def _run_concurrently(calls):
+	"""
+	Run [(fn, args), ...] on a fixed thread pool and return results in order.
+	
+	The pool lives only for this call: a module-level pool would keep its
+	threads alive across script module reloads (every project save).
+	An exception in a task surfaces from Future.get(), wrapped in an
+	ExecutionException.
+	"""
+	if not calls:
+		return []
+	pool = Executors.newFixedThreadPool(min(MAX_CONCURRENT_REQUESTS, len(calls)))
+	try:
+		futures = [pool.submit(_Task(fn, args)) for fn, args in calls]
+		return [f.get() for f in futures]
+	finally:
+		pool.shutdown()
+
+# ----------------------------------------------------------------------
+# JSON helpers
+# ----------------------------------------------------------------------
+def _json_encode(obj):
+	"""
+	Serialize a request payload to a JSON string.
+	
+	All request bodies go through here so the encoder can be swapped in one
+	place. system.util.jsonEncode runs in Java; C-accelerated encoders such as
+	orjson/ujson cannot be loaded by Ignition's Jython runtime.
+	
+	The result stays a unicode string on purpose: there is no encoder here
+	that produces UTF-8 bytes directly, and turning the string into a byte[]
+	ourselves (String.getBytes) is the same single encode httpClient does
+	when it is given a string, so passing bytes would not save a copy.
+	"""
+	return system.util.jsonEncode(obj)
+
+def _read_text(resp):
+	"""
+	Return the response body as text, gunzipping it when the server sent
+	Content-Encoding: gzip.
+	
+	The read calls ask for gzip (large valueRanges compress well). The Java
+	HttpClient behind system.net.httpClient does not decompress bodies, so
+	resp.getText() alone would decode the compressed bytes as characters.
+	"""
+	encoding = None
+	for name, value in (resp.getHeaders() or {}).items():
+		if name.lower() == "content-encoding":
+			encoding = value if isinstance(value, basestring) else value[0]
+			break
+
+	if not encoding or "gzip" not in encoding.lower():
+		return resp.getText()
+
+	stream = GZIPInputStream(ByteArrayInputStream(resp.getBody()))
+	try:
+		out = ByteArrayOutputStream()
+		stream.transferTo(out)
+		return out.toString("UTF-8")
+	finally:
+		stream.close()
+
+def _json_decode(text):
+	"""
+	Parse a response body that was already read with resp.getText() / _read_text().
+	
+	Decoding from the text lets methods that also log or report the body copy
+	it out of Java once instead of calling both getText() and getJson().
+	"""
+	return system.util.jsonDecode(text)